@@ -9,7 +9,8 @@ Last update: 2025‑06‑24 – fixed Google Insight block and syntax errors.
 
 import streamlit as st
 import pandas as pd
-import altair as alt
+import numpy as np
+import io
 from datetime import timedelta
 
 st.set_page_config(page_title="Universal Social Analyzer", layout="wide")
@@ -23,8 +24,32 @@ if main_file is None:
 
 comp_file = st.sidebar.file_uploader("Upload competitor CSV (optional)", type="csv", key="comp")
 
-df_main = pd.read_csv(main_file)
-df_comp = pd.read_csv(comp_file) if comp_file else pd.DataFrame()
+# Streamlit reruns the whole script on every widget change, so parsing is
+# cached on the uploaded bytes and only happens once per file.
+@st.cache_data(show_spinner=False, max_entries=2)
+def load_csv(file_bytes: bytes) -> pd.DataFrame:
+    # multithreaded pyarrow reader first, straight on the uploaded bytes; the C
+    # parser is more lenient with ragged rows, so keep it as the fallback. Both
+    # hand back Arrow-backed columns: packed string buffers instead of one
+    # Python object per cell.
+    try:
+        import pyarrow as pa
+        import pyarrow.csv as pacsv
+        table = pacsv.read_csv(
+            pa.BufferReader(file_bytes),
+            # post text routinely holds quoted line breaks; without this pyarrow
+            # fails on them as soon as the file spans more than one block
+            parse_options=pacsv.ParseOptions(newlines_in_values=True),
+        )
+        # non-UTF-8 text comes back as binary columns rather than an error
+        if not any(pa.types.is_binary(f.type) or pa.types.is_large_binary(f.type) for f in table.schema):
+            return table.to_pandas(types_mapper=pd.ArrowDtype)
+    except (ImportError, ValueError):
+        pass
+    return pd.read_csv(io.BytesIO(file_bytes), dtype_backend="pyarrow")
+
+df_main = load_csv(main_file.getvalue())
+df_comp = load_csv(comp_file.getvalue()) if comp_file else pd.DataFrame()
 
 # ─────────────────────────────────── Column mapping ──────────────────────────────────
 ALIASES = {
@@ -37,23 +62,21 @@ ALIASES = {
     "author": ["author", "pagename", "company", "account"],
 }
 
-def auto(col_list, key):
-    lower = [c.lower() for c in col_list]
-    for alias in ALIASES[key]:
-        if alias in lower:
-            return col_list[lower.index(alias)]
-    return None
+def auto(lower_map, key):
+    return next((lower_map[a] for a in ALIASES[key] if a in lower_map), None)
 
 cols_main = df_main.columns.tolist()
-map_cols = {k: auto(cols_main, k) for k in ALIASES}
+# lowercase once; reversed so the first column wins on case-insensitive duplicates
+lower_main = {c.lower(): c for c in reversed(cols_main)}
+map_cols = {k: auto(lower_main, k) for k in ALIASES}
 
 st.sidebar.header("Map columns (MAIN CSV)")
+opts = [None] + cols_main
+opt_idx = {c: i for i, c in enumerate(opts)}
 for k, label in zip(
     ["likes", "comments", "reposts", "content", "url", "timestamp", "author"],
     ["Likes", "Comments", "Reposts", "Content", "URL (opt.)", "Timestamp (opt.)", "Author"]):
-    opts = [None] + cols_main
-    idx_default = opts.index(map_cols[k]) if map_cols[k] else 0
-    map_cols[k] = st.sidebar.selectbox(label, opts, index=idx_default, key=k)
+    map_cols[k] = st.sidebar.selectbox(label, opts, index=opt_idx.get(map_cols[k], 0), key=k)
 
 if None in [map_cols[c] for c in ("likes", "comments", "reposts", "author")]:
     st.error("Please map at least likes, comments, reposts and author.")
@@ -61,35 +84,105 @@ if None in [map_cols[c] for c in ("likes", "comments", "reposts", "author")]:
 
 # ────────────────────────────── Helper: enrich dataframe ─────────────────────────────
 
-def enrich(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
-    # numeric clean
-    for col in (map_cols["likes"], map_cols["comments"], map_cols["reposts"]):
-        df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0).astype(int)
-    df["total_interactions"] = df[[map_cols["likes"], map_cols["comments"], map_cols["reposts"]]].sum(axis=1)
+def parse_timestamps(s: pd.Series) -> pd.Series:
+    """to_datetime with format="ISO8601" when the first value parses that way.
+
+    pandas otherwise infers one exact format from the first value and turns
+    every row written differently into NaT; exports mix ISO variants (date
+    only, "T" or space, fractional seconds), and ISO8601 accepts all of them.
+    Non-ISO columns keep the inferred format.
+    """
+    fmt = None
+    sample = s.dropna().head(1)
+    if not sample.empty:
+        try:
+            pd.to_datetime(sample, format="ISO8601")
+            fmt = "ISO8601"
+        except (ValueError, TypeError):
+            pass
+    return pd.to_datetime(s, format=fmt, errors="coerce")
+
+@st.cache_data(show_spinner=False, max_entries=2)
+def enrich(df: pd.DataFrame, mapping: tuple) -> pd.DataFrame:
+    # no defensive copy: the input always comes from load_csv, whose cache
+    # already hands out a fresh frame, and the column assignments below only
+    # replace the columns they touch
+    cols = dict(mapping)
+    # numeric clean: coerce the three metrics into one (rows × 3) block, zero the
+    # NaNs in place and get total_interactions from the same block
+    metrics = [cols["likes"], cols["comments"], cols["reposts"]]
+    block = np.column_stack([
+        pd.to_numeric(df[c], errors="coerce").to_numpy(dtype="float64", na_value=np.nan) for c in metrics
+    ])
+    np.nan_to_num(block, copy=False, nan=0.0)
+    # social counts fit in int32, which halves the bytes every later sum/mean/sort
+    # has to read; fall back to int64 only if a row total could overflow
+    fits_int32 = np.abs(block).max(axis=0, initial=0).sum() <= np.iinfo(np.int32).max
+    block = block.astype(np.int32 if fits_int32 else np.int64)
+    for i, col in enumerate(metrics):
+        df[col] = block[:, i]
+    df["total_interactions"] = block.sum(axis=1, dtype=block.dtype)
 
     # timestamp
-    if map_cols["timestamp"] and map_cols["timestamp"] in df.columns:
-        ts = map_cols["timestamp"]
-        df[ts] = pd.to_datetime(df[ts], errors="coerce")
-        df["date_time"] = df[ts].dt.strftime("%Y-%m-%d %H:%M")
-    else:
-        df["date_time"] = "NA"
+    if cols["timestamp"] and cols["timestamp"] in df.columns:
+        ts = cols["timestamp"]
+        df[ts] = parse_timestamps(df[ts])
 
     # topic flag
-    df["google_topic"] = df[map_cols["content"]].astype(str).str.contains("google", case=False, na=False)
+    # Arrow-backed strings let the scan run in pyarrow's substring kernel
+    # instead of looping over Python str objects
+    content = df[cols["content"]].astype("string[pyarrow]")
+    df["google_topic"] = content.str.contains("google", case=False, regex=False, na=False).to_numpy(dtype=bool)
     return df
 
-df_main = enrich(df_main)
-df_comp = enrich(df_comp) if not df_comp.empty else pd.DataFrame()
-
-MAIN_BRAND = df_main[map_cols["author"]].mode()[0]
-
-df_main["brand"] = MAIN_BRAND
+# dicts are not hashable cache keys, so the mapping is passed as a tuple
+mapping = tuple(map_cols.items())
+df_main = enrich(df_main, mapping)
+df_comp = enrich(df_comp, mapping) if not df_comp.empty else pd.DataFrame()
+
+def format_time(df: pd.DataFrame):
+    """Display string for the timestamp column, built only for the rows shown."""
+    ts = map_cols["timestamp"]
+    if ts and ts in df.columns:
+        return df[ts].dt.strftime("%Y-%m-%d %H:%M")
+    return "NA"
+
+# download_button needs its payload up front, so without caching every rerun
+# would re-serialize the frame even if nobody clicks
+@st.cache_data(show_spinner=False, max_entries=4)
+def to_csv_bytes(df: pd.DataFrame) -> bytes:
+    return df.to_csv(index=False).encode()
+
+# most frequent author: one hash pass + bincount, no sort over the uniques
+codes, authors = pd.factorize(df_main[map_cols["author"]])
+MAIN_BRAND = authors[np.bincount(codes[codes >= 0]).argmax()]
+
+# brand is a group key, so store it as a categorical up front; the main frame's
+# single brand is built from zero codes without hashing N identical strings
+df_main["brand"] = pd.Categorical.from_codes(np.zeros(len(df_main), dtype=np.int8), categories=[MAIN_BRAND])
 if not df_comp.empty:
-    df_comp["brand"] = df_comp[map_cols["author"]]
+    df_comp["brand"] = df_comp[map_cols["author"]].astype("category")
 
 # ───────────────────────────────────── Tabs ────────────────────────────────────────
+SCATTER_MAX_POINTS = 5000
+# plain Vega-Lite spec, so reruns skip Altair's spec building and validation;
+# the plotted frame is renamed to these fixed field names
+SCATTER_SPEC = {
+    "mark": {"type": "circle", "size": 60, "opacity": 0.6},
+    "encoding": {
+        "x": {"field": "total_interactions", "type": "quantitative"},
+        "y": {"field": "comments", "type": "quantitative"},
+        "color": {"field": "google_topic", "type": "nominal"},
+        "tooltip": [
+            {"field": "content", "type": "nominal"},
+            {"field": "total_interactions", "type": "quantitative"},
+            {"field": "comments", "type": "quantitative"},
+        ],
+    },
+    "params": [{"name": "grid", "select": {"type": "interval", "encodings": ["x", "y"]}, "bind": "scales"}],
+}
+RAW_PAGE_ROWS = 1000
+
 TABS = ["Overview", "Top 10", "Google Insight"]
 if not df_comp.empty:
     TABS.insert(1, "Compare")
@@ -101,57 +194,88 @@ idx = {name: i for i, name in enumerate(TABS)}
 # ─────────────────────────────── Overview tab ──────────────────────────────────────
 with pages[idx["Overview"]]:
     st.subheader(f"Overview – {MAIN_BRAND}")
+    # one reduction over the three metrics; the mean of the total is their sum
+    avg_likes, avg_comments, avg_reposts = (
+        df_main[[map_cols["likes"], map_cols["comments"], map_cols["reposts"]]].to_numpy().mean(axis=0)
+    )
     a, b, c, d = st.columns(4)
-    a.metric("Avg Likes", f"{df_main[map_cols['likes']].mean():.1f}")
-    b.metric("Avg Comments", f"{df_main[map_cols['comments']].mean():.1f}")
-    c.metric("Avg Reposts", f"{df_main[map_cols['reposts']].mean():.1f}")
-    d.metric("Avg Interactions", f"{df_main['total_interactions'].mean():.1f}")
+    a.metric("Avg Likes", f"{avg_likes:.1f}")
+    b.metric("Avg Comments", f"{avg_comments:.1f}")
+    c.metric("Avg Reposts", f"{avg_reposts:.1f}")
+    d.metric("Avg Interactions", f"{avg_likes + avg_comments + avg_reposts:.1f}")
 
     st.markdown("#### Scatter: Comments vs Total interactions (Google color)")
-    st.altair_chart(
-        alt.Chart(df_main).mark_circle(size=60, opacity=0.6).encode(
-            x="total_interactions",
-            y=map_cols["comments"],
-            color="google_topic:N",
-            tooltip=[map_cols["content"], "total_interactions", map_cols["comments"]],
-        ).interactive(),
-        use_container_width=True,
+    # send only the encoded columns to the browser, and cap the rows: past a
+    # few thousand points the marks just overlap
+    plot_df = df_main[[map_cols["content"], "total_interactions", map_cols["comments"], "google_topic"]].set_axis(
+        ["content", "total_interactions", "comments", "google_topic"], axis=1
     )
+    if len(plot_df) > SCATTER_MAX_POINTS:
+        plot_df = plot_df.sample(n=SCATTER_MAX_POINTS, random_state=0)
+    # the post text is only there for the tooltip; a preview is enough
+    plot_df = plot_df.assign(content=plot_df["content"].astype("string[pyarrow]").str.slice(0, 120))
+    if len(plot_df) < len(df_main):
+        st.caption(f"Showing a random sample of {SCATTER_MAX_POINTS:,} of {len(df_main):,} posts")
+    st.vega_lite_chart(plot_df, SCATTER_SPEC, use_container_width=True)
 
 # ─────────────────────────────── Compare tab ──────────────────────────────────────
 if "Compare" in TABS:
     with pages[idx["Compare"]]:
         st.subheader("Compare brands")
-        combined = pd.concat([df_main, df_comp], ignore_index=True)
-
-        agg = combined.groupby("brand").agg(
-            posts=(map_cols["likes"], "count"),
-            avg_likes=(map_cols["likes"], "mean"),
-            avg_comments=(map_cols["comments"], "mean"),
-            avg_reposts=(map_cols["reposts"], "mean"),
-            avg_total=("total_interactions", "mean"),
-        ).reset_index()
-
-        if map_cols["timestamp"] and map_cols["timestamp"] in combined.columns:
-            span = (combined[map_cols["timestamp"]].max() - combined[map_cols["timestamp"]].min()).days / 7
+
+        # aggregate each frame on its own and stack the few result rows, rather
+        # than concatenating the full frames just to split them again; sums and
+        # counts are stacked (not means) so a brand present in both uploads is
+        # merged back into one row before dividing
+        def brand_sums(df: pd.DataFrame) -> pd.DataFrame:
+            return df.groupby("brand", observed=True, sort=False).agg(
+                posts=(map_cols["likes"], "count"),
+                likes=(map_cols["likes"], "sum"),
+                comments=(map_cols["comments"], "sum"),
+                reposts=(map_cols["reposts"], "sum"),
+                total=("total_interactions", "sum"),
+            )
+
+        sums = pd.concat([brand_sums(df_main), brand_sums(df_comp)]).groupby(level=0).sum()
+        agg = pd.DataFrame({
+            "posts": sums["posts"],
+            "avg_likes": sums["likes"] / sums["posts"],
+            "avg_comments": sums["comments"] / sums["posts"],
+            "avg_reposts": sums["reposts"] / sums["posts"],
+            "avg_total": sums["total"] / sums["posts"],
+        }).rename_axis("brand").reset_index()
+
+        ts = map_cols["timestamp"]
+        stamps = [d[ts] for d in (df_main, df_comp) if ts and ts in d.columns]
+        if stamps:
+            stamps = pd.concat(stamps)
+            span = (stamps.max() - stamps.min()).days / 7
             span = max(span, 1)
             agg["posts_per_week"] = agg["posts"] / span
 
-        hl = lambda row: ["background-color:#dfe6fd" if row["brand"] == MAIN_BRAND else "" for _ in row]
+        # one styling call for the whole table instead of a Python callback per row
+        def hl(frame: pd.DataFrame) -> pd.DataFrame:
+            is_main = (frame["brand"] == MAIN_BRAND).to_numpy()[:, None]
+            css = np.where(is_main, "background-color:#dfe6fd", "")
+            return pd.DataFrame(np.broadcast_to(css, frame.shape), index=frame.index, columns=frame.columns)
+
         fmts = {c: "{:.1f}" for c in agg.columns if c != "brand"}
-        st.dataframe(agg.style.apply(hl, axis=1).format(fmts), use_container_width=True)
+        st.dataframe(agg.style.apply(hl, axis=None).format(fmts), use_container_width=True)
 
 # ─────────────────────────────── Top‑10 tab ──────────────────────────────────────
 with pages[idx["Top 10"]]:
     st.subheader(f"Top 10 posts – {MAIN_BRAND}")
-    top10 = df_main.sort_values("total_interactions", ascending=False).head(10).copy()
-
-    def linkify(r):
-        if map_cols["url"] and pd.notna(r[map_cols["url"]]):
-            return f"<a href='{r[map_cols['url']]}' target='_blank'>{str(r[map_cols['content']])[:80]}</a>"
-        return str(r[map_cols["content"]])[:80]
-
-    top10["Post"] = top10.apply(linkify, axis=1)
+    top10 = df_main.nlargest(10, "total_interactions").copy()
+
+    # build the links column-wise rather than with a per-row apply
+    snippet = top10[map_cols["content"]].astype("string[pyarrow]").str.slice(0, 80)
+    if map_cols["url"]:
+        url = top10[map_cols["url"]]
+        linked = "<a href='" + url.astype("string[pyarrow]") + "' target='_blank'>" + snippet + "</a>"
+        top10["Post"] = linked.where(url.notna(), snippet)
+    else:
+        top10["Post"] = snippet
+    top10["date_time"] = format_time(top10)
     show_cols = ["Post", "date_time", map_cols["likes"], map_cols["comments"], map_cols["reposts"], "total_interactions", "google_topic"]
     st.write(top10[show_cols].to_html(escape=False), unsafe_allow_html=True)
 
@@ -159,31 +283,39 @@ with pages[idx["Top 10"]]:
 with pages[idx["Google Insight"]]:
     st.subheader(f"Google topic insight – {MAIN_BRAND}")
 
-    # Segment definitions
-    high = df_main[df_main["total_interactions"] >= 10]
-    low  = df_main[df_main["total_interactions"] < 10]
+    # Segment definitions: counts and means come from one bincount over a
+    # segment id, so only the table we display is materialized as a frame
+    ti = df_main["total_interactions"].to_numpy()
+    is_high = ti >= 10
+    is_google = df_main["google_topic"].to_numpy()
+    # 0 high·Google, 1 high·non‑Google, 2 low·Google, 3 low·non‑Google
+    seg = 2 * ~is_high + ~is_google
+    counts = np.bincount(seg, minlength=4)
+    sums = np.bincount(seg, weights=ti, minlength=4)
+    means = np.divide(sums, counts, out=np.zeros(4), where=counts > 0)
 
-    g_high = high[high["google_topic"]]
-    ng_high = high[~high["google_topic"]]
-    g_low = low[low["google_topic"]]
-    ng_low = low[~low["google_topic"]]
+    ng_high = df_main[is_high & ~is_google]
 
     # KPI cards
     c1, c2, c3, c4 = st.columns(4)
-    c1.metric("High ≥10 • Google", len(g_high))
-    c2.metric("High ≥10 • non‑Google", len(ng_high))
-    c3.metric("Low <10 • Google", len(g_low))
-    c4.metric("Total Google posts", int(df_main["google_topic"].sum()))
+    c1.metric("High ≥10 • Google", int(counts[0]))
+    c2.metric("High ≥10 • non‑Google", int(counts[1]))
+    c3.metric("Low <10 • Google", int(counts[2]))
+    c4.metric("Total Google posts", int(counts[0] + counts[2]))
 
     # High performers without Google topic
     st.markdown("#### High performers **without** Google topic")
     if ng_high.empty:
         st.info("No high‑performer without Google topic.")
     else:
-        cols_show = [map_cols["content"], "date_time", "total_interactions"]
-        st.dataframe(ng_high[cols_show])
+        ng_show = pd.DataFrame({
+            map_cols["content"]: ng_high[map_cols["content"]],
+            "date_time": format_time(ng_high),
+            "total_interactions": ng_high["total_interactions"],
+        })
+        st.dataframe(ng_show)
         st.download_button(
-            "Download CSV", ng_high[cols_show].to_csv(index=False).encode(),
+            "Download CSV", to_csv_bytes(ng_show),
             "high_non_google.csv", key="dl_ng_high"
         )
 
@@ -193,20 +325,25 @@ with pages[idx["Google Insight"]]:
         "Segment": [
             "High Google", "High non‑Google", "Low Google", "Low non‑Google"
         ],
-        "Posts": [len(g_high), len(ng_high), len(g_low), len(ng_low)],
-        "Avg interactions": [
-            g_high.total_interactions.mean(),
-            ng_high.total_interactions.mean() if len(ng_high) else 0,
-            g_low.total_interactions.mean(),
-            ng_low.total_interactions.mean() if len(ng_low) else 0,
-        ],
+        "Posts": counts,
+        "Avg interactions": means,
     })
     st.dataframe(summary.round(1))
 
 # ─────────────────────────────── Raw tab ─────────────────────────────────────────
+# a fragment, so flipping pages reruns only this table and not the whole script
+@st.fragment
+def raw_page(df: pd.DataFrame):
+    # only one page of rows is sent to the browser; the download has everything
+    n_pages = max(1, -(-len(df) // RAW_PAGE_ROWS))
+    page = st.number_input("Page", min_value=1, max_value=n_pages, value=1, step=1, key="raw_page")
+    start = (page - 1) * RAW_PAGE_ROWS
+    st.dataframe(df.iloc[start:start + RAW_PAGE_ROWS], use_container_width=True)
+    st.caption(f"Rows {start + 1:,}–{min(start + RAW_PAGE_ROWS, len(df)):,} of {len(df):,} · download for the full data")
+
 with pages[idx["Raw"]]:
     st.subheader("Raw & Downloads")
-    st.dataframe(df_main, use_container_width=True)
-    st.download_button("Download main enriched CSV", df_main.to_csv(index=False).encode(), "main_enriched.csv", key="dl_main")
+    raw_page(df_main)
+    st.download_button("Download main enriched CSV", to_csv_bytes(df_main), "main_enriched.csv", key="dl_main")
     if not df_comp.empty:
-        st.download_button("Download competitor enriched CSV", df_comp.to_csv(index=False).encode(), "comp_enriched.csv", key="dl_comp")
+        st.download_button("Download competitor enriched CSV", to_csv_bytes(df_comp), "comp_enriched.csv", key="dl_comp")
@@ -9,9 +9,10 @@ Last update: 2025‑06‑27 – fixed top 10 sorting.
 
 import streamlit as st
 import pandas as pd
-import altair as alt
-import re
+import numpy as np
 import io
+import csv
+import warnings
 from datetime import datetime, timedelta
 
 # Initialize Streamlit
@@ -26,58 +27,71 @@ if main_file is None:
 
 comp_file = st.sidebar.file_uploader("Upload competitor CSV (optional)", type="csv", key="comp")
 
-# Enhanced CSV reading function
-def robust_read_csv(file):
-    """Read CSV with multiple fallback methods, handling different delimiters"""
+def sniff_delimiter(sample):
+    """Guess the delimiter from a text sample, defaulting to comma"""
+    # only the delimiter is taken from the Sniffer: it reads post text that is
+    # wrapped in apostrophes as quoting, while these exports always quote with "
     try:
-        content = file.getvalue().decode('utf-8', errors='ignore')
-    except AttributeError:
-        st.error("Invalid file upload")
-        return pd.DataFrame()
+        return csv.Sniffer().sniff(sample, delimiters=',;\t|').delimiter
+    except csv.Error:
+        return ','
+
+# Enhanced CSV reading function, cached on the uploaded bytes so widget
+# interactions don't re-run the parse on every rerun
+@st.cache_data(show_spinner=False, max_entries=2)
+def robust_read_csv(file_bytes: bytes) -> tuple[pd.DataFrame, int]:
+    """Read CSV bytes with the sniffed delimiter: pyarrow first, then the C parser.
+
+    Returns the frame and the number of malformed lines that were skipped.
+    """
+    # Pick the delimiter once from the head of the file instead of paying for
+    # a failed full parse per candidate delimiter
+    sep = sniff_delimiter(file_bytes[:65536].decode('utf-8', errors='ignore'))
     
-    # First try comma delimiter
+    # First try pyarrow's multithreaded reader straight on the bytes, skipping
+    # the full-file decode and the StringIO round trip; ArrowDtype columns hand
+    # the parsed buffers to pandas without converting them to NumPy/object
     try:
-        return pd.read_csv(io.StringIO(content))
-    except pd.errors.ParserError:
-        try:
-            # Try semicolon delimiter
-            return pd.read_csv(io.StringIO(content), sep=';')
-        except:
-            try:
-                # Try with different engines and error handling
-                return pd.read_csv(io.StringIO(content), engine='python', on_bad_lines='warn')
-            except:
-                try:
-                    # Try with different encoding
-                    return pd.read_csv(io.StringIO(content), encoding='latin1')
-                except:
-                    # Final fallback - manual cleaning
-                    lines = content.split('\n')
-                    cleaned = []
-                    for line in lines:
-                        # Handle semicolon-delimited lines
-                        if ';' in line:
-                            parts = line.split(';')
-                            # Filter out empty parts
-                            parts = [p for p in parts if p.strip() != '']
-                            cleaned.append(parts)
-                        # Handle comma-delimited lines
-                        elif ',' in line:
-                            parts = line.split(',')
-                            parts = [p for p in parts if p.strip() != '']
-                            cleaned.append(parts)
-                    
-                    # Convert to DataFrame if we have data
-                    if len(cleaned) > 1 and len(cleaned[0]) > 1:
-                        header = cleaned[0]
-                        data = cleaned[1:]
-                        return pd.DataFrame(data, columns=header)
-                    else:
-                        return pd.DataFrame()
+        import pyarrow as pa
+        import pyarrow.csv as pacsv
+        table = pacsv.read_csv(
+            pa.BufferReader(file_bytes),
+            read_options=pacsv.ReadOptions(use_threads=True, block_size=8 << 20),
+            # post text routinely holds quoted line breaks; without this pyarrow
+            # fails on them as soon as the file spans more than one block
+            parse_options=pacsv.ParseOptions(delimiter=sep, newlines_in_values=True),
+        )
+        # pyarrow doesn't reject non-UTF-8 text, it returns those columns as
+        # binary; leave such files to the decode path below
+        if not any(pa.types.is_binary(f.type) or pa.types.is_large_binary(f.type) for f in table.schema):
+            return table.to_pandas(types_mapper=pd.ArrowDtype), 0
+    except (ImportError, ValueError):
+        pass
+    
+    # pyarrow bailed out: unparseable dialect, or text columns it could only
+    # read as binary because they aren't UTF-8 (e.g. Excel's latin-1 exports);
+    # decode those as latin-1 instead of dropping the undecodable characters
+    try:
+        content = file_bytes.decode('utf-8')
+    except UnicodeDecodeError:
+        content = file_bytes.decode('latin-1')
+    
+    # Then the C parser, skipping malformed lines rather than re-parsing the
+    # whole file with slower engines. It only accepts a callable on_bad_lines on
+    # the python engine, so the skips are counted from its ParserWarnings
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always', pd.errors.ParserWarning)
+        df = pd.read_csv(
+            io.StringIO(content), sep=sep, low_memory=False, on_bad_lines='warn', dtype_backend='pyarrow'
+        )
+    skipped = sum(
+        str(w.message).count('Skipping line') for w in caught if issubclass(w.category, pd.errors.ParserWarning)
+    )
+    return df, skipped
 
 try:
-    df_main = robust_read_csv(main_file)
-    df_comp = robust_read_csv(comp_file) if comp_file else pd.DataFrame()
+    df_main, skipped_main = robust_read_csv(main_file.getvalue())
+    df_comp, skipped_comp = robust_read_csv(comp_file.getvalue()) if comp_file else (pd.DataFrame(), 0)
     
     # Clean column names
     if not df_main.empty:
@@ -89,28 +103,46 @@ except Exception as e:
     st.error(f"Error reading CSV: {str(e)}")
     st.stop()
 
+# Malformed lines are skipped rather than failing the upload; say so in the app
+for label, skipped in [("main", skipped_main), ("competitor", skipped_comp)]:
+    if skipped:
+        st.warning(f"Skipped {skipped:,} malformed line(s) in the {label} CSV.")
+
 # ──────────────────────────── Improved Column Auto-Detection ────────────────────────────
+# Every pattern is a plain substring, so matching is an equality / `in` test
+# on the lowercased column name rather than a regex
+COLUMN_PATTERNS = {
+    "likes": ["like", "favorite", "favourite", "reaction", "likecount"],
+    "comments": ["comment", "reply", "commentcount"],
+    "reposts": ["repost", "share", "retweet", "repostcount"],
+    "content": ["content", "text", "message", "caption", "body"],
+    "url": ["url", "link", "permalink", "tweetlink", "posturl"],
+    "timestamp": ["timestamp", "date", "time", "created", "tweetdate", "posttimestamp"],
+    "author": ["author", "page", "company", "account", "brand", "handle"],
+    "views": ["view", "impression", "viewcount"],
+}
+
 def detect_column(df, patterns):
-    """Find best matching column using regex patterns and scoring system"""
+    """Find best matching column using substring patterns and scoring system"""
     if df.empty or not hasattr(df, 'columns'):
         return None
         
-    cols = df.columns.str.lower()
+    cols = [c.lower() for c in df.columns]
     best_match = None
     best_score = 0
     
     for pattern in patterns:
         for i, col in enumerate(cols):
             # Score based on match type
-            if re.fullmatch(pattern, col):
+            if col == pattern:
                 score = 3  # Exact match
-            elif re.search(pattern, col):
+            elif pattern in col:
                 score = 2  # Partial match
             else:
                 continue
                 
             # Prefer longer matches and exact matches
-            if score > best_score or (score == best_score and len(col) > len(df.columns[best_match].lower() if best_match is not None else '')):
+            if score > best_score or (score == best_score and len(col) > len(cols[best_match] if best_match is not None else '')):
                 best_match = i
                 best_score = score
     
@@ -122,18 +154,8 @@ def detect_columns(df):
         return {}
         
     mapping = {}
-    patterns = {
-        "likes": [r"like", r"favou?rite", r"reaction", r"likecount"],
-        "comments": [r"comment", r"reply", r"commentcount"],
-        "reposts": [r"repost", r"share", r"retweet", r"repostcount"],
-        "content": [r"content", r"text", r"message", r"caption", r"body"],
-        "url": [r"url", r"link", r"permalink", r"tweetlink", r"posturl"],
-        "timestamp": [r"timestamp", r"date", r"time", r"created", r"tweetdate", r"posttimestamp"],
-        "author": [r"author", r"page", r"company", r"account", r"brand", r"handle"],
-        "views": [r"view", r"impression", r"viewcount"],
-    }
     
-    for col_type, pattern_list in patterns.items():
+    for col_type, pattern_list in COLUMN_PATTERNS.items():
         detected = detect_column(df, pattern_list)
         mapping[col_type] = detected
         
@@ -186,65 +208,158 @@ include_reposts = st.sidebar.checkbox("Include reposts in total interactions", v
 include_views = st.sidebar.checkbox("Include views as separate metric", value=True)
 
 # ────────────────────────────── Helper: enrich dataframe ─────────────────────────────
-def enrich(df: pd.DataFrame) -> pd.DataFrame:
+def parse_timestamps(s: pd.Series) -> pd.Series:
+    """Parse as ISO8601 when the first value is ISO, else let pandas infer.
+
+    Inference locks onto the first value's exact layout, so mixed ISO variants
+    (date only, "T" vs space, fractional seconds) would otherwise become NaT.
+    """
+    fmt = None
+    sample = s.dropna().head(1)
+    if not sample.empty:
+        try:
+            pd.to_datetime(sample, format="ISO8601")
+            fmt = "ISO8601"
+        except (ValueError, TypeError):
+            pass
+    return pd.to_datetime(s, format=fmt, errors="coerce")
+
+# cached so widget interactions on the tabs don't re-coerce, re-parse dates and
+# re-scan the content; the mapping comes in as an argument instead of the global
+@st.cache_data(show_spinner=False, max_entries=2)
+def enrich(df: pd.DataFrame, mapping: tuple, include_reposts: bool) -> pd.DataFrame:
     if df.empty:
         return df
         
     df = df.copy()
+    cols = dict(mapping)
     
     # Create default columns for missing metrics
+    num_cols = []
     for col_type in ["likes", "comments", "reposts", "views"]:
-        col_name = map_cols[col_type]
+        col_name = cols[col_type]
         if col_name and col_name in df.columns:
-            df[col_name] = pd.to_numeric(df[col_name], errors="coerce").fillna(0).astype(int)
+            num_cols.append(col_name)
         else:
             # Create a column of zeros if not mapped
             df[col_type] = 0
-            map_cols[col_type] = col_type  # Update mapping to use new column
+            cols[col_type] = col_type  # Update mapping to use new column
+    
+    # Coerce all mapped metrics in one pass; social counts fit in int32 (with
+    # room for their row sum), which halves the bytes every later sort/groupby scans
+    num_cols = list(dict.fromkeys(num_cols))
+    if num_cols:
+        nums = df[num_cols].apply(pd.to_numeric, errors="coerce").fillna(0)
+        fits_int32 = nums.abs().max().sum() <= 2**31 - 1
+        df[num_cols] = nums.astype("int32" if fits_int32 else "int64")
     
     # Calculate total interactions (configurable)
     interaction_cols = []
-    if map_cols["likes"] in df.columns:
-        interaction_cols.append(map_cols["likes"])
-    if map_cols["comments"] in df.columns:
-        interaction_cols.append(map_cols["comments"])
-    if include_reposts and map_cols["reposts"] in df.columns:
-        interaction_cols.append(map_cols["reposts"])
+    if cols["likes"] in df.columns:
+        interaction_cols.append(cols["likes"])
+    if cols["comments"] in df.columns:
+        interaction_cols.append(cols["comments"])
+    if include_reposts and cols["reposts"] in df.columns:
+        interaction_cols.append(cols["reposts"])
     
     if interaction_cols:
-        df["total_interactions"] = df[interaction_cols].sum(axis=1)
+        # one NumPy row sum over the integer block, kept at the metrics' width
+        # (the int32 check above already covers the row total)
+        values = df[interaction_cols].to_numpy()
+        df["total_interactions"] = values.sum(axis=1, dtype=values.dtype)
     else:
         df["total_interactions"] = 0
 
     # Timestamp handling
-    if map_cols["timestamp"] and map_cols["timestamp"] in df.columns:
-        ts = map_cols["timestamp"]
-        df[ts] = pd.to_datetime(df[ts], errors="coerce")
-        df["date_time"] = df[ts].dt.strftime("%Y-%m-%d %H:%M")
-        
-        # Create a date-only column for date range calculation
-        df["date"] = df[ts].dt.date
-    else:
-        df["date_time"] = "NA"
-        df["date"] = None
+    if cols["timestamp"] and cols["timestamp"] in df.columns:
+        ts = cols["timestamp"]
+        df[ts] = parse_timestamps(df[ts])
+
+    # Author is a low-cardinality group key; as a category, groupbys and the
+    # competitor brand column work on integer codes instead of strings
+    if cols["author"] and cols["author"] in df.columns and cols["author"] not in num_cols:
+        df[cols["author"]] = df[cols["author"]].astype("category")
 
     # Topic detection
-    if map_cols["content"] and map_cols["content"] in df.columns:
-        df["google_topic"] = df[map_cols["content"]].astype(str).str.contains("google", case=False, na=False)
+    if cols["content"] and cols["content"] in df.columns:
+        # Arrow-backed strings let the scan run in pyarrow's substring kernel
+        # instead of looping over Python str objects; the converted column is kept
+        # so the Top-10 previews slice it the same way. Literal needle, so regex=False
+        content = cols["content"]
+        if df[content].dtype != "string[pyarrow]":
+            df[content] = df[content].astype("string[pyarrow]")
+        df["google_topic"] = df[content].str.contains("google", case=False, regex=False, na=False).to_numpy(dtype=bool)
     else:
         df["google_topic"] = False
         
     return df
 
-df_main = enrich(df_main)
-df_comp = enrich(df_comp) if not df_comp.empty else pd.DataFrame()
+def apply_enrich(df):
+    """Run the cached enrich() and point map_cols at any zero columns it added"""
+    # dicts are not hashable cache keys, so the mapping is passed as a tuple
+    out = enrich(df, tuple(map_cols.items()), include_reposts)
+    for col_type in ["likes", "comments", "reposts", "views"]:
+        if not df.empty and map_cols[col_type] not in df.columns:
+            map_cols[col_type] = col_type
+    return out
+
+df_main = apply_enrich(df_main)
+df_comp = apply_enrich(df_comp) if not df_comp.empty else pd.DataFrame()
+
+def format_time(df: pd.DataFrame):
+    """Display string for the timestamp column, built only for the rows shown"""
+    ts = map_cols["timestamp"]
+    if ts and ts in df.columns:
+        return df[ts].dt.strftime("%Y-%m-%d %H:%M")
+    return "NA"
 
-# Set brand name
-df_main["brand"] = MAIN_BRAND
+# download_button needs its payload up front, so without caching every rerun
+# would re-serialize each frame even if nobody clicks; writing into a BytesIO
+# skips building the whole CSV as a str and then encoding a second copy
+@st.cache_data(show_spinner=False, max_entries=6)
+def to_csv_bytes(df: pd.DataFrame) -> bytes:
+    buf = io.BytesIO()
+    df.to_csv(buf, index=False, encoding="utf-8")
+    return buf.getvalue()
+
+# Set brand name; both frames share one categorical dtype, so the Compare concat
+# keeps integer codes and its groupby never hashes brand strings
+comp_brands = []
+if not df_comp.empty:
+    has_author = map_cols.get("author") in df_comp.columns
+    comp_brands = list(df_comp[map_cols["author"]].astype("category").cat.categories) if has_author else ["Competitor"]
+# categories sorted by name, so the Compare groupby lists brands alphabetically
+brand_dtype = pd.CategoricalDtype(categories=sorted(set([MAIN_BRAND] + comp_brands), key=str))
+df_main["brand"] = pd.Categorical.from_codes(
+    np.full(len(df_main), brand_dtype.categories.get_loc(MAIN_BRAND)), dtype=brand_dtype
+)
 if not df_comp.empty:
-    df_comp["brand"] = df_comp[map_cols["author"]] if map_cols.get("author") in df_comp.columns else "Competitor"
+    if has_author:
+        df_comp["brand"] = df_comp[map_cols["author"]].astype(brand_dtype)
+    else:
+        df_comp["brand"] = pd.Categorical.from_codes(
+            np.full(len(df_comp), brand_dtype.categories.get_loc("Competitor")), dtype=brand_dtype
+        )
 
 # ───────────────────────────────────── Tabs ────────────────────────────────────────
+SCATTER_MAX_POINTS = 5000
+# plain Vega-Lite spec, so reruns skip Altair's spec building and validation;
+# the Overview tab builds its plot frame with these fixed field names as columns
+SCATTER_SPEC = {
+    "mark": {"type": "circle", "size": 60, "opacity": 0.6},
+    "encoding": {
+        "x": {"field": "likes", "type": "quantitative", "title": "Likes"},
+        "y": {"field": "comments", "type": "quantitative", "title": "Comments"},
+        "color": {"field": "google_topic", "type": "nominal", "legend": {"title": "Google Mention"}},
+        "tooltip": [
+            {"field": "content", "type": "nominal"},
+            {"field": "likes", "type": "quantitative"},
+            {"field": "comments", "type": "quantitative"},
+        ],
+    },
+    "params": [{"name": "grid", "select": {"type": "interval", "encodings": ["x", "y"]}, "bind": "scales"}],
+}
+
 TABS = ["Overview", "Top 10", "Google Insight"]
 if not df_comp.empty:
     TABS.insert(1, "Compare")
@@ -268,11 +383,13 @@ with pages[idx["Overview"]]:
     date_range = "N/A"
     min_date = None
     max_date = None
-    if not df_main.empty and "date" in df_main.columns and not df_main["date"].isnull().all():
-        valid_dates = df_main[df_main["date"].notnull()]["date"]
-        if not valid_dates.empty:
-            min_date = valid_dates.min()
-            max_date = valid_dates.max()
+    ts = map_cols.get("timestamp")
+    if not df_main.empty and ts and ts in df_main.columns:
+        # min/max skip NaT, so no filtered copy of the column is needed
+        min_ts, max_ts = df_main[ts].min(), df_main[ts].max()
+        if pd.notna(min_ts):
+            min_date = min_ts.date()
+            max_date = max_ts.date()
             date_range = f"{min_date.strftime('%d-%m')} to {max_date.strftime('%d-%m %Y')}"
     cols[1].metric("Date Range", date_range)
     
@@ -325,7 +442,7 @@ with pages[idx["Overview"]]:
     # Download button for overview metrics
     st.download_button(
         "Download Overview Metrics",
-        metrics_df.to_csv(index=False).encode(),
+        to_csv_bytes(metrics_df),
         "overview_metrics.csv",
         key="dl_overview_metrics"
     )
@@ -334,13 +451,19 @@ with pages[idx["Overview"]]:
     if not df_main.empty:
         if map_cols["likes"] in df_main.columns and map_cols["comments"] in df_main.columns:
             st.markdown("#### Scatter: Comments vs Likes")
-            chart = alt.Chart(df_main).mark_circle(size=60, opacity=0.6).encode(
-                x=alt.X(map_cols["likes"], title="Likes"),
-                y=alt.Y(map_cols["comments"], title="Comments"),
-                color=alt.Color("google_topic:N", legend=alt.Legend(title="Google Mention")),
-                tooltip=[map_cols["content"], map_cols["likes"], map_cols["comments"]]
-            ).interactive()
-            st.altair_chart(chart, use_container_width=True)
+            # ship only the encoded columns and at most SCATTER_MAX_POINTS rows to
+            # the browser; past a few thousand points the marks just overlap
+            plot_df = pd.DataFrame({
+                "likes": df_main[map_cols["likes"]],
+                "comments": df_main[map_cols["comments"]],
+                "google_topic": df_main["google_topic"],
+            })
+            if map_cols["content"] in df_main.columns:
+                plot_df["content"] = df_main[map_cols["content"]]
+            if len(plot_df) > SCATTER_MAX_POINTS:
+                plot_df = plot_df.sample(n=SCATTER_MAX_POINTS, random_state=0)
+                st.caption(f"Showing a random sample of {SCATTER_MAX_POINTS:,} of {len(df_main):,} posts")
+            st.vega_lite_chart(plot_df, SCATTER_SPEC, use_container_width=True)
         else:
             st.warning("Missing like or comment data for scatter plot")
     else:
@@ -350,7 +473,11 @@ with pages[idx["Overview"]]:
 if "Compare" in TABS and not df_comp.empty and not df_main.empty:
     with pages[idx["Compare"]]:
         st.subheader("Compare brands")
-        combined = pd.concat([df_main, df_comp], ignore_index=True)
+        # concat only the columns the aggregation reads instead of copying both
+        # frames whole; enrich() already made the metrics integer on both sides
+        agg_cols = ["brand"] + [map_cols[m] for m in ["likes", "comments", "reposts", "views"]] + ["total_interactions"]
+        agg_cols = [c for c in dict.fromkeys(agg_cols) if c in df_main.columns and c in df_comp.columns]
+        combined = pd.concat([df_main[agg_cols], df_comp[agg_cols]], ignore_index=True)
 
         # Create aggregation based on available columns
         agg_config = {
@@ -366,7 +493,7 @@ if "Compare" in TABS and not df_comp.empty and not df_main.empty:
         if "total_interactions" in combined.columns:
             agg_config["avg_total"] = ("total_interactions", "mean")
         
-        agg = combined.groupby("brand").agg(**agg_config).reset_index().round(1)
+        agg = combined.groupby("brand", observed=True).agg(**agg_config).reset_index().round(1)
 
         # Highlight main brand
         def highlight_row(row):
@@ -378,7 +505,7 @@ if "Compare" in TABS and not df_comp.empty and not df_main.empty:
         # Download button for comparison data
         st.download_button(
             "Download Comparison Data",
-            agg.to_csv(index=False).encode(),
+            to_csv_bytes(agg),
             "comparison_data.csv",
             key="dl_comparison"
         )
@@ -390,31 +517,33 @@ with pages[idx["Top 10"]]:
     if not df_main.empty:
         # FIXED: Always sort by total interactions for top performers
         if "total_interactions" in df_main.columns:
-            # Create a sorted copy to avoid modifying original
-            sorted_df = df_main.sort_values("total_interactions", ascending=False).copy()
-            
-            # Get top 10 based on total interactions
-            top10 = sorted_df.head(10)
+            # Get top 10 based on total interactions; nlargest only partially
+            # sorts and returns a new frame, so the original is left untouched
+            top10 = df_main.nlargest(10, "total_interactions")
             st.caption("Sorted by Total Interactions")
             
             # Create post previews
             if map_cols["content"] in top10.columns:
                 top10["preview"] = top10[map_cols["content"]].str[:80] + "..."
             
-            # Create download links if URL exists
-            if map_cols["url"] in top10.columns:
-                top10["link"] = top10.apply(
-                    lambda x: f'<a href="{x[map_cols["url"]]}" target="_blank">🔗</a>', 
-                    axis=1
-                )
-            
-            # Show table
+            # Show table; the URL column itself is rendered as a link, so no
+            # per-row HTML has to be built
             show_cols = []
+            column_config = {}
             if "preview" in top10.columns:
                 show_cols.append("preview")
-            if "link" in top10.columns:
-                show_cols.append("link")
-            show_cols.extend(["date_time"])
+            if map_cols["url"] in top10.columns:
+                show_cols.append(map_cols["url"])
+                column_config[map_cols["url"]] = st.column_config.LinkColumn("link", display_text="🔗")
+            # the parsed timestamps go to the browser as-is and are formatted
+            # there, rather than strftime'd in Python
+            ts = map_cols["timestamp"]
+            if ts in top10.columns:
+                show_cols.append(ts)
+                column_config[ts] = st.column_config.DatetimeColumn("date_time", format="YYYY-MM-DD HH:mm")
+            else:
+                top10["date_time"] = "NA"
+                show_cols.append("date_time")
             
             # Add available metrics
             for metric in ["likes", "comments", "reposts", "views"]:
@@ -424,13 +553,18 @@ with pages[idx["Top 10"]]:
             if "total_interactions" in top10.columns:
                 show_cols.append("total_interactions")
             
-            # Display with interaction counts
-            st.write(top10[show_cols].to_html(escape=False), unsafe_allow_html=True)
+            # Display with interaction counts; st.dataframe ships the rows as Arrow
+            # instead of a pandas-rendered HTML string
+            # several metrics can resolve to the same source column (the numeric
+            # fallback in detect_columns), and st.dataframe rejects duplicate names
+            show_cols = list(dict.fromkeys(show_cols))
+            st.dataframe(top10[show_cols], column_config=column_config, use_container_width=True)
             
             # Prepare download version with embedded URL
             if not top10.empty:
                 # Create a copy for download
                 download_top10 = top10.copy()
+                download_top10["date_time"] = format_time(download_top10)
                 
                 # Add full content column
                 if map_cols["content"] in download_top10.columns:
@@ -460,12 +594,12 @@ with pages[idx["Top 10"]]:
                     download_cols.append("total_interactions")
                 
                 # Create final download dataframe
-                download_df = download_top10[download_cols]
+                download_df = download_top10[list(dict.fromkeys(download_cols))]
                 
                 # Download button for top posts
                 st.download_button(
                     "Download Top 10 Posts",
-                    download_df.to_csv(index=False).encode(),
+                    to_csv_bytes(download_df),
                     "top_10_posts.csv",
                     key="dl_top10"
                 )
@@ -479,26 +613,30 @@ with pages[idx["Google Insight"]]:
     st.subheader(f"Google topic insight – {MAIN_BRAND}")
     
     if not df_main.empty and "google_topic" in df_main.columns and "total_interactions" in df_main.columns:
-        # Segment data
-        high = df_main[df_main["total_interactions"] >= 10]  # High performers
-        low = df_main[df_main["total_interactions"] < 10]    # Low performers
-        
-        # Create segments
-        segments = {
-            "High ≥10 • Google": high[high["google_topic"]],
-            "High ≥10 • non‑Google": high[~high["google_topic"]],
-            "Low <10 • Google": low[low["google_topic"]],
-            "Low <10 • non‑Google": low[~low["google_topic"]]
+        # Segment data: one groupby on (high performer, google) gives every
+        # segment's count and mean without copying four filtered frames
+        is_high = df_main["total_interactions"] >= 10
+        is_google = df_main["google_topic"]
+        segment_names = {
+            (True, True): "High ≥10 • Google",
+            (True, False): "High ≥10 • non‑Google",
+            (False, True): "Low <10 • Google",
+            (False, False): "Low <10 • non‑Google"
         }
+        stats = (
+            df_main["total_interactions"].groupby([is_high, is_google]).agg(["size", "mean"])
+            .reindex(list(segment_names)).fillna(0)
+        )
         
         # Show metrics
         cols = st.columns(4)
-        for (name, segment), col in zip(segments.items(), cols):
-            col.metric(name, len(segment))
+        for name, posts, col in zip(segment_names.values(), stats["size"], cols):
+            col.metric(name, int(posts))
         
-        # Show low performers with Google topic
+        # Show low performers with Google topic; the only segment whose rows are needed
         st.markdown("#### Low performers with Google topic")
-        low_google = segments["Low <10 • Google"]
+        low_google = df_main[~is_high & is_google]
+        low_google = low_google.assign(date_time=format_time(low_google))
         
         if not low_google.empty:
             # Simplified to avoid bracket confusion
@@ -511,7 +649,7 @@ with pages[idx["Google Insight"]]:
             
             st.download_button(
                 "Download Low Google Performers",
-                low_google.to_csv(index=False).encode(),
+                to_csv_bytes(low_google),
                 "low_google.csv",
                 key="dl_low_google"
             )
@@ -520,30 +658,27 @@ with pages[idx["Google Insight"]]:
         
         # Summary table
         st.markdown("#### Performance Summary")
-        summary_data = []
-        for name, segment in segments.items():
-            if segment.empty:
-                avg = 0
-            else:
-                avg = segment["total_interactions"].mean()
-            summary_data.append({
-                "Segment": name,
-                "Posts": len(segment),
-                "Avg Interactions": round(avg, 1)
-            })
+        summary = pd.DataFrame({
+            "Segment": list(segment_names.values()),
+            "Posts": stats["size"].astype(int).to_numpy(),
+            "Avg Interactions": stats["mean"].round(1).to_numpy()
+        })
         
-        st.dataframe(pd.DataFrame(summary_data))
+        st.dataframe(summary)
     else:
         st.warning("Google topic analysis not available")
 
 # ─────────────────────────────── Raw tab ─────────────────────────────────────────
 with pages[idx["Raw"]]:
     st.subheader("Raw Data & Downloads")
-    st.dataframe(df_main, use_container_width=True)
+    raw_config = {}
+    if map_cols.get("timestamp") in df_main.columns:
+        raw_config[map_cols["timestamp"]] = st.column_config.DatetimeColumn(format="YYYY-MM-DD HH:mm")
+    st.dataframe(df_main, column_config=raw_config, use_container_width=True)
     
     st.download_button(
         "Download Processed Data", 
-        df_main.to_csv(index=False).encode(), 
+        to_csv_bytes(df_main), 
         "processed_data.csv", 
         key="dl_processed"
     )